@@ -4,12 +4,15 @@ import serial
 import tkinter.messagebox as messagebox
 import serial.tools.list_ports
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import pandas as pd
 from datetime import datetime
 import threading
 import time
 import os
+from collections import OrderedDict
+import numpy as np
+from utm_data import MinMaxPyramid, TraceCache, UIStateSnapshot, load_trace_file, view_request
 from PIL import Image, ImageTk
 import sv_ttk  # Modern theme for tkinter
 
@@ -64,6 +67,17 @@ class CreateToolTip(object):
         if tw:
             tw.destroy()
 
+# Toolbar navigasi plot: tombol Home mengaktifkan kembali autoscale
+# sehingga plot kembali mengikuti data live setelah zoom/pan
+class PlotToolbar(NavigationToolbar2Tk):
+    def __init__(self, canvas, window, on_home):
+        self.on_home = on_home
+        super().__init__(canvas, window, pack_toolbar=False)
+
+    def home(self, *args):
+        super().home(*args)
+        self.on_home()
+
 class UTMInterface:
     def __init__(self, root):
         self.root = root
@@ -95,6 +109,10 @@ class UTMInterface:
             'graph3': '#dc3545'
         }
         
+        # Warna untuk overlay hasil pengujian sebelumnya
+        self.overlay_colors = ['#6c757d', '#17a2b8', '#ffc107', '#e83e8c', '#6f42c1',
+                               '#fd7e14', '#20c997', '#adb5bd', '#795548', '#9e9d24']
+        
         # Tidak menggunakan ikon
         
         # Serial Communication
@@ -115,11 +133,36 @@ class UTMInterface:
         self.sample_area = 100.0  # mm² (cross-sectional area)
         self.sample_length = 50.0  # mm (initial length)
         
+        # Piramida min/max untuk trace live, dibangun bertahap saat data masuk
+        self.reset_pyramids()
+        
+        # Overlay pengujian sebelumnya (path -> warna, kunci cache, batas data).
+        # Piramida overlay hanya dimiliki oleh cache; garis plot cukup menyimpan path.
+        self.trace_cache = TraceCache(max_bytes=64 * 1024 * 1024)
+        self.overlays = OrderedDict()
+        self.overlay_lines = {}
+        self.overlay_views = {}  # rentang tampilan terakhir overlay per axes
+        
+        # Blitting: latar (sumbu, grid, overlay) disimpan dan hanya trace live
+        # yang digambar ulang pada setiap frame
+        self.background = None
+        self.drawing_background = False
+        self.autoscale_limits = {}  # batas sumbu hasil autoscale per axes
+        
+        # State UI dari thread akuisisi, dibaca oleh timer di thread Tk
+        self.ui_state = UIStateSnapshot()
+        self.ui_state_version = 0
+        self.published_samples = 0  # jumlah sampel lengkap di self.data yang sudah dipublikasikan
+        self.ui_refresh_ms = 50
+        
         self.setup_gui()
         self.setup_plots()
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.ui_timer = self.root.after(self.ui_refresh_ms, self.poll_ui_state)
 
     def on_closing(self):
+        self.is_collecting = False
+        self.root.after_cancel(self.ui_timer)
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             print("Serial port closed.")
@@ -141,7 +184,7 @@ class UTMInterface:
         # Configure control frame grid
         for i in range(4):
             control_frame.columnconfigure(i, weight=1)
-        for i in range(6):  # Increased to 6 for sample parameters frame
+        for i in range(7):  # Increased to 7 for previous tests frame
             control_frame.rowconfigure(i, weight=1)
         
         # Store references to buttons for state control
@@ -279,6 +322,32 @@ class UTMInterface:
         ttk.Label(data_frame, text="Strain:").grid(row=1, column=2, padx=5, pady=5, sticky="e")
         ttk.Label(data_frame, textvariable=self.current_values['strain']).grid(row=1, column=3, padx=5, pady=5, sticky="w")
         
+        # Previous Tests Frame (overlay perbandingan)
+        overlay_frame = ttk.LabelFrame(control_frame, text="Previous Tests", padding=5)
+        overlay_frame.grid(row=6, column=0, columnspan=4, padx=5, pady=5, sticky="nsew")
+        
+        overlay_buttons = ttk.Frame(overlay_frame)
+        overlay_buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
+        self.load_overlay_btn = ttk.Button(overlay_buttons, text="Load Tests", command=self.load_overlays, width=12)
+        self.load_overlay_btn.pack(side=tk.LEFT, padx=5)
+        CreateToolTip(self.load_overlay_btn, "Muat file CSV pengujian sebelumnya\nPilih item pada daftar untuk menampilkan/menyembunyikan")
+        
+        self.clear_overlay_btn = ttk.Button(overlay_buttons, text="Clear", command=self.clear_overlays, width=10)
+        self.clear_overlay_btn.pack(side=tk.LEFT, padx=5)
+        
+        list_frame = ttk.Frame(overlay_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        
+        self.overlay_list = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, height=5, exportselection=False,
+                                       activestyle='none', background='#2e2e2e', foreground='white',
+                                       selectbackground='#3e3e3e', highlightthickness=0)
+        overlay_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.overlay_list.yview)
+        self.overlay_list.configure(yscrollcommand=overlay_scroll.set)
+        self.overlay_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        overlay_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.overlay_list.bind("<<ListboxSelect>>", self.on_overlay_select)
+        
         self.toggle_buttons_state(False)
         
     def setup_plots(self):
@@ -323,10 +392,36 @@ class UTMInterface:
         self.line2, = self.ax2.plot([], [], lw=2, color=self.colors['graph3'])
         self.line3, = self.ax3.plot([], [], lw=2, color=self.colors['graph2'])
         
+        # Overlay di belakang trace live
+        for line in [self.line1, self.line2, self.line3]:
+            line.set_zorder(3)
+        
+        # (axes, line, nama piramida) untuk setiap plot
+        self.plot_series = [
+            (self.ax1, self.line1, 'force'),
+            (self.ax2, self.line2, 'stress'),
+            (self.ax3, self.line3, 'resistance')
+        ]
+        
         # Add canvas to plot frame
         self.canvas = FigureCanvasTkAgg(self.fig, master=plot_frame)
+        
+        # Toolbar untuk zoom/pan
+        self.toolbar = PlotToolbar(self.canvas, plot_frame, on_home=self.reset_view)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
+        # Ambil ulang titik dari piramida setiap kali rentang x berubah
+        for ax in [self.ax1, self.ax2, self.ax3]:
+            ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        
+        # Gambar penuh dari luar (zoom, resize) membuat latar tersimpan tidak valid
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        
+        # Lebar axes menentukan jumlah titik yang diambil dari piramida
+        self.canvas.mpl_connect('resize_event', self.on_resize)
+        
         # Add status bar
         self.setup_status_bar(main_container)
         
@@ -478,6 +573,9 @@ class UTMInterface:
             'stress': [],
             'strain': []
         }
+        self.published_samples = 0
+        self.reset_pyramids()
+        self.invalidate_background()
         self.update_plots() # Update plots to clear them
         
         # Reset current values display
@@ -552,47 +650,287 @@ class UTMInterface:
                         stress_val = (force_val / self.sample_area) * 1000000  # Force (N) / Area (mm²) * 1000000 = Stress (Pa)
                         strain_val = (disp_val / self.sample_length) * 100  # (Displacement (mm) / Initial length (mm)) * 100 = Strain (%)
                         
-                        # Store all data
-                        self.data['time'].append(time.time())
-                        self.data['mass'].append(mass_val)
-                        self.data['displacement'].append(disp_val)
-                        self.data['voltage'].append(volt_val)
-                        self.data['resistance'].append(res_val)
-                        self.data['force'].append(force_val)
-                        self.data['stress'].append(stress_val)
-                        self.data['strain'].append(strain_val)
-                        
-                        # Update current values display
-                        self.current_values['force'].set(f"{force_val:.2f} N")
-                        self.current_values['displacement'].set(f"{disp_val:.2f} mm")
-                        self.current_values['stress'].set(f"{stress_val:.2f} Pa")
-                        self.current_values['strain'].set(f"{strain_val:.2f} %")
+                        # Store all data. Satu sampel selalu masuk utuh ke buffer yang sama
+                        # walaupun reset_test mengganti self.data di tengah jalan.
+                        data = self.data
+                        data['time'].append(time.time())
+                        data['mass'].append(mass_val)
+                        data['displacement'].append(disp_val)
+                        data['voltage'].append(volt_val)
+                        data['resistance'].append(res_val)
+                        data['force'].append(force_val)
+                        data['stress'].append(stress_val)
+                        data['strain'].append(strain_val)
                         
-                        # Update sample count
-                        self.status_vars['samples'].set(f"Samples: {len(self.data['time'])}")
-                        
-                        self.update_plots()
+                        # Publikasikan nilai terbaru setelah sampel lengkap; tampilan
+                        # diperbarui oleh poll_ui_state
+                        self.ui_state.publish(force=force_val, displacement=disp_val,
+                                              stress=stress_val, strain=strain_val,
+                                              samples=len(data['time']), data=data)
                     except Exception as e:
                         print(f"Error parsing data: {e}")
                         pass
                         
+    def poll_ui_state(self):
+        # Berjalan di thread Tk: biaya tetap per frame, berapa pun laju sampel.
+        # Jadwalkan frame berikutnya lebih dulu agar error tidak menghentikan timer.
+        self.ui_timer = self.root.after(self.ui_refresh_ms, self.poll_ui_state)
+        version, state = self.ui_state.read()
+        # Abaikan snapshot dari buffer lama yang sudah diganti oleh reset_test
+        if version != self.ui_state_version and state['data'] is self.data:
+            self.ui_state_version = version
+            self.published_samples = state['samples']
+            self.current_values['force'].set(f"{state['force']:.2f} N")
+            self.current_values['displacement'].set(f"{state['displacement']:.2f} mm")
+            self.current_values['stress'].set(f"{state['stress']:.2f} Pa")
+            self.current_values['strain'].set(f"{state['strain']:.2f} %")
+            self.status_vars['samples'].set(f"Samples: {state['samples']}")
+            self.update_plots()
+        
     def update_plots(self):
-        # Update Force vs Displacement plot
-        self.line1.set_data(self.data['displacement'], self.data['force'])
-        self.ax1.relim()
-        self.ax1.autoscale_view()
+        self.sync_pyramids()
         
-        # Update Stress vs Strain plot
-        self.line2.set_data(self.data['strain'], self.data['stress'])
-        self.ax2.relim()
-        self.ax2.autoscale_view()
+        # Force vs Displacement, Stress vs Strain, Resistance vs Strain
+        for ax, line, name in self.plot_series:
+            line.set_data(*self.pyramids[name].query(*view_request(ax)))
         
-        # Update Resistance vs Strain plot
-        self.line3.set_data(self.data['strain'], self.data['resistance'])
-        self.ax3.relim()
-        self.ax3.autoscale_view()
+        # Latar hanya digambar ulang jika batas sumbu berubah
+        for index, (ax, _, _) in enumerate(self.plot_series):
+            if ax.get_autoscalex_on() and self.autoscale_axes(index):
+                self.background = None
         
-        self.canvas.draw()
+        for ax in [self.ax1, self.ax2, self.ax3]:
+            self.refresh_overlays(ax)
+        
+        self.blit_live()
+        
+    def autoscale_axes(self, index):
+        # Autoscale dari batas piramida (live dan overlay yang tampil) tanpa relim.
+        # Batas diberi ruang 10% sehingga latar tidak perlu digambar ulang setiap sampel.
+        ax, _, name = self.plot_series[index]
+        bounds = [self.pyramids[name].bounds()]
+        bounds += [self.overlays[path]['bounds'][name] for path in self.overlay_lines]
+        # Batas NaN/inf tidak boleh masuk ke set_xlim/set_ylim (ValueError)
+        bounds = [b for b in bounds if b is not None and np.all(np.isfinite(b))]
+        if not bounds:
+            return False
+        xlo, xhi = min(b[0] for b in bounds), max(b[1] for b in bounds)
+        ylo, yhi = min(b[2] for b in bounds), max(b[3] for b in bounds)
+        limits = self.autoscale_limits.get(index)
+        if limits and limits[0] <= xlo and xhi <= limits[1] and limits[2] <= ylo and yhi <= limits[3]:
+            return False
+        limits = self.padded_range(xlo, xhi) + self.padded_range(ylo, yhi)
+        self.autoscale_limits[index] = limits
+        ax.set_xlim(limits[0], limits[1], auto=None)
+        ax.set_ylim(limits[2], limits[3], auto=None)
+        return True
+        
+    @staticmethod
+    def padded_range(lo, hi):
+        span = hi - lo
+        if span <= 0:
+            span = abs(hi) or 1.0
+        return (lo - 0.1 * span, hi + 0.1 * span)
+        
+    def invalidate_background(self):
+        # Dipanggil saat overlay atau tampilan berubah: autoscale dihitung ulang dari awal
+        self.autoscale_limits = {}
+        self.background = None
+        
+    def on_draw(self, event):
+        if not self.drawing_background:
+            self.background = None
+        
+    def draw_background(self):
+        # Gambar semua kecuali trace live, lalu simpan sebagai latar
+        self.drawing_background = True
+        for _, line, _ in self.plot_series:
+            line.set_visible(False)
+        try:
+            self.canvas.draw()
+        finally:
+            for _, line, _ in self.plot_series:
+                line.set_visible(True)
+            self.drawing_background = False
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        
+    def blit_live(self):
+        # Biaya per frame hanya trace live, berapa pun jumlah overlay
+        if self.background is None:
+            self.draw_background()
+        self.canvas.restore_region(self.background)
+        for ax, line, _ in self.plot_series:
+            ax.draw_artist(line)
+        self.canvas.blit(self.fig.bbox)
+        
+    def reset_pyramids(self):
+        self.pyramids = {
+            'force': MinMaxPyramid(),
+            'stress': MinMaxPyramid(),
+            'resistance': MinMaxPyramid()
+        }
+        
+    def sync_pyramids(self):
+        # Tambahkan hanya sampel baru yang sudah dipublikasikan lengkap ke piramida
+        n = self.published_samples
+        if self.pyramids['force'].count > n:
+            self.reset_pyramids()
+        for name, x_key in [('force', 'displacement'), ('stress', 'strain'), ('resistance', 'strain')]:
+            pyramid = self.pyramids[name]
+            if n > pyramid.count:
+                pyramid.extend(self.data[x_key][pyramid.count:n], self.data[name][pyramid.count:n])
+        
+    def refresh_overlays(self, ax):
+        index = [self.ax1, self.ax2, self.ax3].index(ax)
+        request = view_request(ax)
+        if self.overlay_views.get(index) == request:
+            return
+        self.overlay_views[index] = request
+        name = self.plot_series[index][2]
+        for path, lines in self.overlay_lines.items():
+            # Overlay yang tampil di-pin di cache; tidak pernah memuat file di sini
+            traces = self.trace_cache.get(self.overlays[path]['key'])
+            if traces is not None:
+                lines[index].set_data(*traces[name].query(*request))
+        
+    def on_xlim_changed(self, ax):
+        # Dipanggil saat zoom/pan maupun autoscale; kanvas digambar ulang oleh pemanggil
+        for plot_ax, line, name in self.plot_series:
+            if plot_ax is ax:
+                line.set_data(*self.pyramids[name].query(*view_request(ax)))
+        self.refresh_overlays(ax)
+        
+    def on_resize(self, event):
+        # Ambil ulang titik sesuai lebar baru; kanvas digambar ulang oleh backend
+        self.overlay_views = {}
+        for ax, line, name in self.plot_series:
+            line.set_data(*self.pyramids[name].query(*view_request(ax)))
+            self.refresh_overlays(ax)
+        
+    def reset_view(self):
+        for ax in [self.ax1, self.ax2, self.ax3]:
+            ax.autoscale(True)
+        self.invalidate_background()
+        self.update_plots()
+        
+    def load_overlays(self):
+        filenames = tk.filedialog.askopenfilenames(
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        hidden = []
+        for filename in filenames:
+            path = os.path.abspath(filename)
+            is_new = path not in self.overlays
+            try:
+                # File yang sudah dimuat hanya dimuat ulang jika sudah ditimpa
+                if not is_new and self.overlays[path]['key'] == self.overlay_key(path):
+                    continue
+                key, traces = self.load_overlay(path)
+            except Exception as e:
+                tk.messagebox.showerror("Error", f"Failed to load {os.path.basename(path)}: {str(e)}")
+                continue
+            if not is_new:
+                # Garis overlay yang tampil diambil ulang dari data baru
+                self.overlay_views = {}
+                continue
+            self.overlay_list.insert(tk.END, os.path.basename(path))
+            index = self.overlay_list.size() - 1
+            color = self.overlays[path]['color']
+            self.overlay_list.itemconfig(index, foreground=color, selectforeground=color)
+            # Overlay baru langsung ditampilkan (di-pin sebelum file berikutnya dimuat)
+            # selama overlay yang tampil masih muat dalam budget cache
+            if self.overlay_fits(path):
+                self.trace_cache.pin(key)
+                self.overlay_list.selection_set(index)
+            else:
+                hidden.append(os.path.basename(path))
+        if hidden:
+            tk.messagebox.showwarning("Memory Limit", "Loaded but not shown (overlay memory limit reached):\n\n"
+                                      + "\n".join(hidden))
+        self.on_overlay_select()
+        
+    def overlay_fits(self, path):
+        return self.trace_cache.pinned_bytes() + self.overlays[path]['nbytes'] <= self.trace_cache.max_bytes
+        
+    def overlay_key(self, path):
+        # Kunci cache menyertakan waktu modifikasi dan ukuran agar file yang ditimpa dimuat ulang
+        stat = os.stat(path)
+        return (path, stat.st_mtime, stat.st_size)
+        
+    def load_overlay(self, path):
+        # Muat file ke cache dan perbarui kunci, ukuran, dan batas data overlay
+        key = self.overlay_key(path)
+        traces = load_trace_file(path)
+        overlay = self.overlays.get(path)
+        if overlay is None:
+            color = self.overlay_colors[len(self.overlays) % len(self.overlay_colors)]
+            overlay = self.overlays[path] = {'color': color, 'key': key}
+        elif overlay['key'] != key:
+            # Data lama dibuang; overlay yang tampil tetap di-pin dengan kunci baru
+            was_pinned = overlay['key'] in self.trace_cache.pinned
+            self.trace_cache.remove(overlay['key'])
+            if was_pinned:
+                self.trace_cache.pin(key)
+            overlay['key'] = key
+        self.trace_cache.put(key, traces)
+        overlay['nbytes'] = sum(trace.nbytes for trace in traces.values())
+        overlay['bounds'] = {name: trace.bounds() for name, trace in traces.items()}
+        return key, traces
+        
+    def get_overlay_traces(self, path):
+        # Dimuat ulang dari file (dengan kunci dan batas baru) hanya jika sudah dibuang dari cache
+        traces = self.trace_cache.get(self.overlays[path]['key'])
+        if traces is None:
+            _, traces = self.load_overlay(path)
+        return traces
+        
+    def on_overlay_select(self, event=None):
+        paths = list(self.overlays)
+        selected = set(paths[i] for i in self.overlay_list.curselection())
+        
+        # Sembunyikan overlay yang tidak dipilih (data tetap di cache, tidak lagi di-pin)
+        for path in list(self.overlay_lines):
+            if path not in selected:
+                for line in self.overlay_lines.pop(path):
+                    line.remove()
+                self.trace_cache.unpin(self.overlays[path]['key'])
+        
+        # Tampilkan overlay yang dipilih; tolak jika melebihi budget cache
+        for index, path in enumerate(paths):
+            if path in selected and path not in self.overlay_lines:
+                if self.overlays[path]['key'] not in self.trace_cache.pinned:
+                    if not self.overlay_fits(path):
+                        self.overlay_list.selection_clear(index)
+                        tk.messagebox.showwarning("Memory Limit", f"Cannot show {os.path.basename(path)}: "
+                                                  "overlay memory limit reached. Hide another test first.")
+                        continue
+                try:
+                    traces = self.get_overlay_traces(path)
+                except Exception as e:
+                    self.overlay_list.selection_clear(index)
+                    print(f"Error loading overlay: {e}")
+                    continue
+                self.trace_cache.pin(self.overlays[path]['key'])
+                color = self.overlays[path]['color']
+                self.overlay_lines[path] = [
+                    ax.plot(*traces[name].query(*view_request(ax)), lw=1, alpha=0.6,
+                            color=color, zorder=2)[0]
+                    for ax, _, name in self.plot_series
+                ]
+        
+        self.invalidate_background()
+        self.update_plots()
+        
+    def clear_overlays(self):
+        for lines in self.overlay_lines.values():
+            for line in lines:
+                line.remove()
+        self.overlay_lines = {}
+        self.overlays = OrderedDict()
+        self.overlay_list.delete(0, tk.END)
+        self.trace_cache.clear()
+        self.invalidate_background()
+        self.update_plots()
         
     def update_sample_parameters(self):
         try:
@@ -629,6 +967,8 @@ class UTMInterface:
                     self.current_values['strain'].set(f"{self.data['strain'][-1]:.2f} %")
                 
                 # Update plots
+                self.reset_pyramids()
+                self.invalidate_background()
                 self.update_plots()
             
             messagebox.showinfo("Parameters Updated", "Sample parameters have been updated successfully.")
@@ -685,6 +1025,8 @@ class UTMInterface:
                 self.data['strain'] = [(disp / self.sample_length) * 100 for disp in self.data['displacement']]  # Convert to %
                 
                 # Update plots with new calculations
+                self.reset_pyramids()
+                self.invalidate_background()
                 self.update_plots()
                 tk.messagebox.showinfo("Recalculation Complete", "Stress and strain values have been recalculated with the new parameters.")
         except ValueError:
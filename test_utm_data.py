@@ -0,0 +1,294 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utm_data import MinMaxPyramid, TraceCache, UIStateSnapshot, load_trace_file, view_request
+
+
+def build_incremental(x, y, seed=0, block_size=16):
+    rng = np.random.default_rng(seed)
+    pyramid = MinMaxPyramid(block_size)
+    i = 0
+    while i < len(x):
+        k = int(rng.integers(1, 3 * block_size))
+        pyramid.extend(x[i:i + k], y[i:i + k])
+        i += k
+    return pyramid
+
+
+def levels_of(pyramid):
+    return [[a[:size] for a in level] for level, size in zip(pyramid.levels, pyramid.level_sizes)]
+
+
+def test_incremental_extend_matches_bulk_build():
+    rng = np.random.default_rng(1)
+    for n in [1, 15, 16, 17, 33, 1000, 4097]:
+        x = np.cumsum(rng.random(n))
+        y = rng.standard_normal(n)
+        bulk = MinMaxPyramid()
+        bulk.extend(x, y)
+        incremental = build_incremental(x, y)
+        assert incremental.count == bulk.count == n
+        assert incremental.level_sizes == bulk.level_sizes
+        for inc_level, bulk_level in zip(levels_of(incremental), levels_of(bulk)):
+            for a, b in zip(inc_level, bulk_level):
+                np.testing.assert_array_equal(a, b)
+
+
+def test_top_level_holds_global_extremes():
+    rng = np.random.default_rng(2)
+    x = np.cumsum(rng.random(5000))
+    y = rng.standard_normal(5000)
+    pyramid = build_incremental(x, y)
+    assert pyramid.level_sizes[-1] == 1
+    assert pyramid.bounds() == (x.min(), x.max(), y.min(), y.max())
+
+
+def test_query_preserves_min_max_of_visible_range():
+    rng = np.random.default_rng(3)
+    x = np.cumsum(rng.random(20000))
+    y = rng.standard_normal(20000)
+    pyramid = MinMaxPyramid()
+    pyramid.extend(x, y)
+
+    qx, qy = pyramid.query(-np.inf, np.inf, 400)
+    assert len(qx) <= 400
+    assert np.nanmax(qy) == y.max()
+    assert np.nanmin(qy) == y.min()
+
+    lo, hi = x[5000], x[9000]
+    qx, qy = pyramid.query(lo, hi, 400)
+    visible = (x >= lo) & (x <= hi)
+    assert np.nanmax(qy) >= y[visible].max()
+    assert np.nanmin(qy) <= y[visible].min()
+
+
+def test_query_returns_raw_samples_when_zoomed_in():
+    x = np.arange(1000.0)
+    y = np.sin(x)
+    pyramid = MinMaxPyramid()
+    pyramid.extend(x, y)
+    qx, qy = pyramid.query(100, 120, 1000)
+    # Blok yang terlihat ditambah satu blok tetangga di setiap sisi
+    np.testing.assert_array_equal(qx, x[80:144])
+    np.testing.assert_array_equal(qy, y[80:144])
+
+
+def test_query_breaks_line_between_non_adjacent_blocks():
+    # Trace naik lalu turun: rentang x yang sama dilewati dua kali
+    x = np.concatenate([np.arange(0, 160.0), np.arange(160.0, 0, -1)])
+    y = np.arange(len(x), dtype=float)
+    pyramid = MinMaxPyramid()
+    pyramid.extend(x, y)
+    qx, qy = pyramid.query(40, 50, 10000)
+    gaps = np.isnan(qx)
+    assert gaps.sum() == 1
+    assert np.isnan(qy[gaps]).all()
+    # Tidak ada sampel yang hilang di sekitar celah
+    assert set(qy[~gaps]) >= set(y[(x >= 40) & (x <= 50)])
+
+
+def test_non_finite_samples_are_ignored():
+    rng = np.random.default_rng(5)
+    x = np.cumsum(rng.random(5000))
+    y = rng.standard_normal(5000)
+    x[[7, 300, 301]] = np.nan
+    y[[0, 16, 17, 999]] = [np.nan, np.inf, -np.inf, np.nan]
+    # Nilai NaN pada posisi yang akan menjadi argmin blok tidak menyembunyikan minimum asli
+    y[40] = np.nan
+    y[41] = -50.0
+    valid = np.isfinite(x) & np.isfinite(y)
+
+    bulk = MinMaxPyramid()
+    bulk.extend(x, y)
+    incremental = build_incremental(x, y)
+    for inc_level, bulk_level in zip(levels_of(incremental), levels_of(bulk)):
+        for a, b in zip(inc_level, bulk_level):
+            np.testing.assert_array_equal(a, b)
+
+    assert bulk.bounds() == (x[valid].min(), x[valid].max(), -50.0, y[valid].max())
+    qx, qy = bulk.query(x[0], x[-1], 400)
+    assert not np.isinf(qx).any() and not np.isinf(qy).any()
+    assert np.nanmin(qy) == -50.0
+    assert np.nanmax(qy) == y[valid].max()
+
+
+def test_pyramid_without_valid_samples():
+    pyramid = MinMaxPyramid()
+    pyramid.extend([np.nan, 1.0, np.inf], [1.0, np.nan, 2.0])
+    assert pyramid.bounds() is None
+    assert [len(a) for a in pyramid.query(-10, 10, 100)] == [0, 0]
+
+
+def test_query_empty_and_out_of_range():
+    pyramid = MinMaxPyramid()
+    assert [len(a) for a in pyramid.query(-np.inf, np.inf, 100)] == [0, 0]
+    assert pyramid.bounds() is None
+    pyramid.extend(np.arange(100.0), np.arange(100.0))
+    assert [len(a) for a in pyramid.query(500, 600, 100)] == [0, 0]
+
+
+def test_from_arrays_matches_extend_and_shares_input():
+    rng = np.random.default_rng(4)
+    x = np.cumsum(rng.random(3000))
+    y = rng.standard_normal(3000)
+    built = MinMaxPyramid.from_arrays(x, y, block_size=16, step=100)
+    extended = MinMaxPyramid()
+    extended.extend(x, y)
+    assert built.x is x
+    assert built.level_sizes == extended.level_sizes
+    for a_level, b_level in zip(levels_of(built), levels_of(extended)):
+        for a, b in zip(a_level, b_level):
+            np.testing.assert_array_equal(a, b)
+
+
+def write_run(path, n):
+    strain = np.linspace(0, 5, n)
+    pd.DataFrame({
+        'Time': np.arange(n, dtype=float),
+        'Displacement (mm)': strain / 2,
+        'Force (N)': np.sin(strain),
+        'Stress (Pa)': np.cos(strain),
+        'Strain (%)': strain,
+        'Resistance (Ω)': strain ** 2
+    }).to_csv(path, index=False)
+    return strain
+
+
+def test_load_trace_file_pages_samples_from_disk(tmp_path):
+    path = tmp_path / 'run.csv'
+    strain = write_run(path, 10000)
+    traces = load_trace_file(path, block_size=64, chunksize=3000)
+    assert set(traces) == {'force', 'stress', 'resistance'}
+    # Kolom strain dipakai bersama oleh trace stress dan resistance
+    assert traces['stress'].x is traces['resistance'].x
+    for trace in traces.values():
+        assert isinstance(trace.x, np.memmap) and isinstance(trace.y, np.memmap)
+        # Hanya level piramida yang dihitung sebagai memori
+        assert trace.nbytes == sum(a.nbytes for level in trace.levels for a in level)
+        assert trace.nbytes < 10000 * 8
+    np.testing.assert_allclose(traces['resistance'].y, strain ** 2)
+    assert traces['force'].bounds() == pytest.approx((0.0, 2.5, -1.0, 1.0), abs=1e-6)
+    qx, qy = traces['resistance'].query(1.0, 1.01, 10000)
+    assert np.all(np.diff(qx) > 0)
+    assert qx[0] < 1.0 and qx[-1] > 1.01
+
+
+def test_load_trace_file_rejects_empty_run(tmp_path):
+    path = tmp_path / 'empty.csv'
+    write_run(path, 0)
+    with pytest.raises(ValueError):
+        load_trace_file(path)
+
+
+def test_rubber_band_zoom_fetches_detail():
+    pytest.importorskip('matplotlib')
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    x = np.arange(1000000.0)
+    y = np.sin(x / 50)
+    pyramid = MinMaxPyramid()
+    pyramid.extend(x, y)
+
+    fig = Figure(figsize=(4, 3), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    line, = ax.plot(*pyramid.query(-np.inf, np.inf, 800))
+    ax.callbacks.connect('xlim_changed', lambda ax: line.set_data(*pyramid.query(*view_request(ax))))
+    fig.canvas.draw()
+
+    def points_in(lo, hi):
+        xs = np.asarray(line.get_xdata())
+        return np.count_nonzero((xs >= lo) & (xs <= hi))
+
+    assert points_in(1000, 1100) < 10
+    # Zoom kotak seperti tombol zoom pada toolbar (koordinat display)
+    (x0, y0), (x1, y1) = ax.transData.transform([(1000, -1), (1100, 1)])
+    ax._set_view_from_bbox((x0, y0, x1, y1))
+    assert not ax.get_autoscalex_on()
+    # Seluruh sampel mentah di rentang yang terlihat sudah diambil ulang
+    assert points_in(1000, 1100) == 101
+
+
+class FakeTrace(object):
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_trace_cache_evicts_least_recently_used():
+    cache = TraceCache(max_bytes=300)
+    cache.put('a', {'force': FakeTrace(100)})
+    cache.put('b', {'force': FakeTrace(100)})
+    cache.put('c', {'force': FakeTrace(100)})
+    assert cache.get('a') is not None  # 'a' menjadi yang terbaru
+    cache.put('d', {'force': FakeTrace(100)})
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.current_bytes == 300
+
+
+def test_trace_cache_accounting_on_replace_and_clear():
+    cache = TraceCache(max_bytes=1000)
+    cache.put('a', {'force': FakeTrace(100), 'stress': FakeTrace(50)})
+    cache.put('a', {'force': FakeTrace(200)})
+    assert cache.current_bytes == 200
+    cache.put('b', {'force': FakeTrace(5000)})
+    # Entri yang lebih besar dari budget tetap disimpan sendirian
+    assert list(cache.entries) == ['b']
+    assert cache.current_bytes == 5000
+    cache.clear()
+    assert cache.current_bytes == 0
+    assert cache.get('b') is None
+
+
+def test_trace_cache_never_evicts_pinned_entries():
+    cache = TraceCache(max_bytes=300)
+    for key in 'abc':
+        cache.put(key, {'force': FakeTrace(100)})
+        cache.pin(key)
+    cache.put('d', {'force': FakeTrace(100)})
+    cache.put('e', {'force': FakeTrace(100)})
+    # Hanya entri yang tidak di-pin yang dibuang
+    assert list(cache.entries) == ['a', 'b', 'c', 'e']
+    assert cache.pinned_bytes() == 300
+    cache.unpin('a')
+    assert list(cache.entries) == ['b', 'c', 'e']
+    assert cache.current_bytes == 300
+    cache.remove('b')
+    assert 'b' not in cache.pinned
+    assert cache.current_bytes == 200
+    cache.clear()
+    assert cache.pinned == set()
+
+
+def test_ui_state_snapshot_versions_and_latest_values():
+    snapshot = UIStateSnapshot()
+    assert snapshot.read() == (0, {})
+    snapshot.publish(force=1.0, samples=1)
+    snapshot.publish(force=2.0, samples=2)
+    assert snapshot.read() == (2, {'force': 2.0, 'samples': 2})
+
+
+def test_ui_state_snapshot_is_consistent_across_threads():
+    snapshot = UIStateSnapshot()
+    done = threading.Event()
+
+    def writer():
+        for i in range(1, 20001):
+            snapshot.publish(a=i, b=-i)
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    last = 0
+    while not done.is_set():
+        version, state = snapshot.read()
+        # Versi tidak pernah mundur dan nilai dalam satu snapshot selalu berpasangan
+        assert version >= last
+        if version:
+            assert state['a'] == -state['b'] == version
+        last = version
+    thread.join()
+    assert snapshot.read() == (20000, {'a': 20000, 'b': -20000})
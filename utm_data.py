@@ -0,0 +1,284 @@
+# Struktur data untuk plot yang tidak bergantung pada GUI (Tk/matplotlib),
+# sehingga dapat diuji tanpa display maupun port serial.
+from collections import OrderedDict
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Trace overlay (x, y) yang dibentuk dari kolom CSV hasil save_data
+TRACE_COLUMNS = {
+    'force': ('Displacement (mm)', 'Force (N)'),
+    'stress': ('Strain (%)', 'Stress (Pa)'),
+    'resistance': ('Strain (%)', 'Resistance (Ω)')
+}
+
+# Piramida min/max multi-resolusi untuk satu trace (x, y).
+# Level 0 berisi blok block_size sampel, setiap level di atasnya menggabungkan
+# dua blok di bawahnya. Setiap blok menyimpan rentang x serta indeks sampel
+# dengan y minimum dan maksimum, sehingga query untuk rentang x yang terlihat
+# hanya mengambil blok seperlunya pada resolusi layar.
+# Tidak thread-safe: extend dan query hanya dipanggil dari thread Tk.
+class MinMaxPyramid(object):
+    def __init__(self, block_size=16):
+        self.block_size = block_size
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.count = 0
+        self.levels = []       # per level: [xmin, xmax, imin, imax]
+        self.level_sizes = []  # jumlah blok terisi per level
+
+    @property
+    def nbytes(self):
+        # Sampel yang dipetakan dari disk (np.memmap) tidak tinggal di memori
+        samples = sum(a.nbytes for a in (self.x, self.y) if not isinstance(a, np.memmap))
+        return samples + sum(a.nbytes for level in self.levels for a in level)
+
+    @classmethod
+    def from_arrays(cls, x, y, block_size=16, step=1 << 20):
+        # Bangun piramida langsung di atas array yang sudah ada tanpa menyalinnya,
+        # sehingga x dapat dipakai bersama dan sampel boleh berupa np.memmap.
+        # Level 0 dibangun per step sampel agar memori sementara tetap kecil.
+        pyramid = cls(block_size)
+        pyramid.x = x
+        pyramid.y = y
+        for start in range(0, len(x), step):
+            pyramid.count = min(len(x), start + step)
+            pyramid._update_levels(start)
+        return pyramid
+
+    def extend(self, xs, ys):
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        if len(xs) == 0:
+            return
+        start = self.count
+        end = start + len(xs)
+        if end > len(self.x):
+            capacity = max(end, 2 * len(self.x), 1024)
+            self.x = self._grow(self.x, capacity, start)
+            self.y = self._grow(self.y, capacity, start)
+        self.x[start:end] = xs
+        self.y[start:end] = ys
+        self.count = end
+        self._update_levels(start)
+
+    def _update_levels(self, start):
+        end = self.count
+
+        # Hitung ulang blok level 0 mulai dari blok pertama yang berubah
+        B = self.block_size
+        first = start // B
+        rows = -(-end // B) - first
+        offsets = np.arange(first, first + rows) * B
+        seg_x = self.x[first * B:end]
+        seg_y = self.y[first * B:end]
+        # Sampel dengan x atau y NaN/inf (mis. pembagian nol di firmware) diabaikan;
+        # blok tanpa sampel valid memiliki xmin = inf sehingga tidak pernah terlihat
+        valid = np.isfinite(seg_x) & np.isfinite(seg_y)
+        xmin = self._pad(np.where(valid, seg_x, np.inf), rows * B, np.inf).reshape(rows, B).min(axis=1)
+        xmax = self._pad(np.where(valid, seg_x, -np.inf), rows * B, -np.inf).reshape(rows, B).max(axis=1)
+        imin = self._pad(np.where(valid, seg_y, np.inf), rows * B, np.inf).reshape(rows, B).argmin(axis=1)
+        imax = self._pad(np.where(valid, seg_y, -np.inf), rows * B, -np.inf).reshape(rows, B).argmax(axis=1)
+        self._store(0, first, xmin, xmax, imin + offsets, imax + offsets)
+
+        # Perbarui level di atasnya hanya untuk blok yang terpengaruh
+        L = 0
+        while self.level_sizes[L] > 1:
+            size = self.level_sizes[L]
+            xmin, xmax, imin, imax = self.levels[L]
+            first //= 2
+            a = np.arange(2 * first, size, 2)
+            b = np.minimum(a + 1, size - 1)
+            pimin = np.where(self._valid_y(imin[b], np.inf) < self._valid_y(imin[a], np.inf), imin[b], imin[a])
+            pimax = np.where(self._valid_y(imax[b], -np.inf) > self._valid_y(imax[a], -np.inf), imax[b], imax[a])
+            self._store(L + 1, first, np.minimum(xmin[a], xmin[b]), np.maximum(xmax[a], xmax[b]),
+                        pimin, pimax)
+            L += 1
+
+    def bounds(self):
+        # (xmin, xmax, ymin, ymax) seluruh trace, diambil dari blok level teratas
+        if self.count == 0:
+            return None
+        xmin, xmax, imin, imax = (a[0] for a in self.levels[-1])
+        if not np.isfinite(xmin):
+            return None  # tidak ada sampel valid
+        return xmin, xmax, self.y[imin], self.y[imax]
+
+    def query(self, xlo, xhi, max_points):
+        # Kembalikan titik untuk rentang x [xlo, xhi] dengan maksimal sekitar max_points titik
+        if self.count == 0:
+            return np.empty(0), np.empty(0)
+        L = len(self.levels) - 1
+        blocks = self._visible(L, np.arange(self.level_sizes[L]), xlo, xhi)
+        # Turun ke level yang lebih detail selama jumlah titik masih muat di layar
+        while L > 0 and len(blocks) and 4 * len(blocks) <= max_points:
+            children = (blocks[:, None] * 2 + np.arange(2)).ravel()
+            L -= 1
+            blocks = self._visible(L, children[children < self.level_sizes[L]], xlo, xhi)
+        if len(blocks) == 0:
+            return np.empty(0), np.empty(0)
+
+        # Sertakan blok tetangga agar garis tetap menyambung sampai tepi tampilan
+        blocks = np.unique(np.concatenate((blocks - 1, blocks, blocks + 1)))
+        blocks = blocks[(blocks >= 0) & (blocks < self.level_sizes[L])]
+
+        B = self.block_size
+        if L == 0 and len(blocks) * B <= max_points:
+            # Cukup detail: gunakan sampel mentah
+            idx = (blocks[:, None] * B + np.arange(B)).ravel()
+            idx = idx[idx < self.count]
+            block_ids = idx // B
+        else:
+            imin = self.levels[L][2][blocks]
+            imax = self.levels[L][3][blocks]
+            idx = np.column_stack((np.minimum(imin, imax), np.maximum(imin, imax))).ravel()
+            block_ids = np.repeat(blocks, 2)
+
+        x = self.x[idx]
+        y = self.y[idx]
+        invalid = ~(np.isfinite(x) & np.isfinite(y))
+        x[invalid] = np.nan
+        y[invalid] = np.nan
+        # Putuskan garis di antara blok yang tidak bersebelahan
+        gaps = np.nonzero(np.diff(block_ids) > 1)[0] + 1
+        if len(gaps):
+            x = np.insert(x, gaps, np.nan)
+            y = np.insert(y, gaps, np.nan)
+        return x, y
+
+    def _valid_y(self, idx, fill):
+        # Nilai y pada indeks sampel, dengan sampel tidak valid diganti fill
+        x = self.x[idx]
+        y = self.y[idx]
+        return np.where(np.isfinite(x) & np.isfinite(y), y, fill)
+
+    def _visible(self, L, blocks, xlo, xhi):
+        xmin, xmax = self.levels[L][0], self.levels[L][1]
+        return blocks[(xmax[blocks] >= xlo) & (xmin[blocks] <= xhi)]
+
+    def _store(self, L, first, xmin, xmax, imin, imax):
+        if L == len(self.levels):
+            self.levels.append([np.empty(0), np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)])
+            self.level_sizes.append(0)
+        level = self.levels[L]
+        size = first + len(xmin)
+        if size > len(level[0]):
+            capacity = max(size, 2 * len(level[0]), 16)
+            for k in range(4):
+                level[k] = self._grow(level[k], capacity, self.level_sizes[L])
+        for arr, values in zip(level, (xmin, xmax, imin, imax)):
+            arr[first:size] = values
+        self.level_sizes[L] = size
+
+    @staticmethod
+    def _grow(arr, capacity, used):
+        grown = np.empty(capacity, dtype=arr.dtype)
+        grown[:used] = arr[:used]
+        return grown
+
+    @staticmethod
+    def _pad(values, length, fill):
+        padded = np.full(length, fill)
+        padded[:len(values)] = values
+        return padded
+
+# Cache LRU untuk piramida trace pengujian sebelumnya dengan batas memori (bytes).
+# Entri yang di-pin (overlay yang sedang tampil) tidak pernah dibuang.
+class TraceCache(object):
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.pinned = set()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, traces):
+        nbytes = sum(trace.nbytes for trace in traces.values())
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (traces, nbytes)
+        self.current_bytes += nbytes
+        self._evict()
+
+    def pin(self, key):
+        self.pinned.add(key)
+
+    def unpin(self, key):
+        self.pinned.discard(key)
+        self._evict()
+
+    def pinned_bytes(self):
+        return sum(self.entries[key][1] for key in self.pinned if key in self.entries)
+
+    def remove(self, key):
+        self.pinned.discard(key)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def clear(self):
+        self.entries.clear()
+        self.pinned.clear()
+        self.current_bytes = 0
+
+    def _evict(self):
+        # Buang entri yang paling lama tidak dipakai sampai muat dalam budget,
+        # kecuali entri yang di-pin dan entri terbaru
+        for key in list(self.entries)[:-1]:
+            if self.current_bytes <= self.max_bytes:
+                break
+            if key not in self.pinned:
+                self.current_bytes -= self.entries.pop(key)[1]
+
+# Snapshot state UI terbaru yang dipublikasikan oleh thread akuisisi.
+# Penulis (satu thread) mengganti seluruh tuple (versi, nilai) dengan satu
+# assignment yang atomik di Python, sehingga pembaca di thread Tk selalu
+# mendapat snapshot yang konsisten tanpa lock.
+class UIStateSnapshot(object):
+    def __init__(self):
+        self._state = (0, {})
+
+    def publish(self, **values):
+        version, _ = self._state
+        self._state = (version + 1, values)
+
+    def read(self):
+        return self._state
+
+def view_request(ax):
+    # Rentang x yang terlihat dan jumlah titik sesuai lebar axes di layar.
+    # Selalu memakai xlim saat ini, bukan status autoscale: toolbar matplotlib
+    # memicu xlim_changed saat zoom sebelum mematikan autoscale.
+    xlo, xhi = sorted(ax.get_xlim())
+    return xlo, xhi, max(2 * int(ax.bbox.width), 2)
+
+def load_trace_file(path, block_size=256, chunksize=1000000):
+    # Muat CSV hasil save_data menjadi piramida untuk setiap trace di TRACE_COLUMNS.
+    # Sampel mentah ditulis per kolom ke file sementara lalu dipetakan (np.memmap),
+    # sehingga yang tinggal di memori hanya level piramida; sampel baru dibaca dari
+    # disk saat tampilan di-zoom cukup dalam. Kolom x yang sama (strain) dipakai bersama.
+    columns = sorted(set(column for pair in TRACE_COLUMNS.values() for column in pair))
+    files = {column: tempfile.TemporaryFile() for column in columns}
+    count = 0
+    try:
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+            for column in columns:
+                files[column].write(chunk[column].to_numpy(dtype=float).tobytes())
+            count += len(chunk)
+        if count == 0:
+            raise ValueError("file contains no samples")
+        samples = {}
+        for column, f in files.items():
+            f.flush()
+            samples[column] = np.memmap(f, dtype=float, mode='r', shape=(count,))
+    finally:
+        for f in files.values():
+            f.close()
+    return {name: MinMaxPyramid.from_arrays(samples[x_col], samples[y_col], block_size)
+            for name, (x_col, y_col) in TRACE_COLUMNS.items()}